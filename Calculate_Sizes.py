@@ -5,7 +5,155 @@ import pandas as pd
 import sys
 import os
 
-def calculate_map_sizes(image_path, equator_circumference, output_file='map_sizes.xlsx'):
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+WHITE = 0xFFFFFF
+
+# pixels per band in the numpy fallback: 64k packed ids (256 KB) fit in L2
+TILE_PIXELS = 1 << 16
+
+# when merging colours, anything with every channel this close to 255 counts as water
+NEAR_WHITE_TOLERANCE = 8
+
+HEX_BYTES = np.array([f"{i:02X}" for i in range(256)])
+
+def pack_rgb(rgb):
+    """pack a (..., 3) uint8 RGB array into (...) uint32 ids of the form 0xRRGGBB"""
+    shape = rgb.shape[:-1]
+    packed = np.zeros(shape, dtype=np.uint32)
+    packed_bytes = packed.view(np.uint8).reshape(shape + (4,))
+    # the low three bytes of each uint32 hold B, G, R, wherever they sit in memory
+    if sys.byteorder == 'little':
+        packed_bytes[..., :3] = rgb[..., ::-1]
+    else:
+        packed_bytes[..., 1:] = rgb
+    return packed
+
+if njit is not None:
+    @njit(cache=True)
+    def _aggregate_pixels(img_array, area_adjustments, counts, areas):
+        """single fused sweep: pack each pixel, skip white, add count and weighted area into the bins for its colour id"""
+        height, width = img_array.shape[0], img_array.shape[1]
+        for y in range(height):
+            weight = area_adjustments[y]
+            for x in range(width):
+                r = np.int64(img_array[y, x, 0])
+                g = np.int64(img_array[y, x, 1])
+                b = np.int64(img_array[y, x, 2])
+                color_id = (r << 16) | (g << 8) | b
+                if color_id != WHITE:
+                    counts[color_id] += 1
+                    areas[color_id] += weight
+
+def aggregate_colors(img_array, area_adjustments):
+    """return present colour ids (0xRRGGBB) with their pixel counts and latitude-weighted areas, white excluded"""
+    if njit is not None:
+        height = img_array.shape[0]
+        # fixed bins over the whole 24-bit colour space; np.zeros gets lazily zeroed pages,
+        # so only the bins of colours actually present cost memory
+        pixel_counts = np.zeros(1 << 24, dtype=np.int64)
+        areas = np.zeros(1 << 24, dtype=np.float64)
+
+        # the kernel runs over about 20 bands of rows purely so progress can be reported
+        band_rows = max(1, -(-height // 20))
+        for top in range(0, height, band_rows):
+            _aggregate_pixels(img_array[top:top + band_rows], area_adjustments[top:top + band_rows], pixel_counts, areas)
+            print(f"Processed {min(top + band_rows, height)}/{height} rows")
+    else:
+        height, width = img_array.shape[:2]
+        tile_rows = max(1, TILE_PIXELS // width)
+
+        land_ids = np.empty(height * width, dtype=np.uint32)
+        land_per_row = np.empty(height, dtype=np.int64)
+        land_count = 0
+
+        # report progress about 20 times however many bands there are
+        tile_tops = range(0, height, tile_rows)
+        progress_step = max(1, len(tile_tops) // 20)
+
+        # filter and pack a band of rows at a time so the intermediates stay in cache;
+        # the kept ids are appended in row-major order
+        for i, top in enumerate(tile_tops):
+            tile = img_array[top:top + tile_rows]
+            # white needs all three channels at 0xFF, so AND them on the native uint8 layout
+            # and only pack the land pixels
+            keep = (tile[:, :, 0] & tile[:, :, 1] & tile[:, :, 2]) != 0xFF
+            tile_land = pack_rgb(tile[keep])
+            land_ids[land_count:land_count + len(tile_land)] = tile_land
+            land_count += len(tile_land)
+            land_per_row[top:top + tile_rows] = np.count_nonzero(keep, axis=1)
+
+            if (i + 1) % progress_step == 0 or (i + 1) == len(tile_tops):
+                print(f"Processed {min(top + tile_rows, height)}/{height} rows")
+
+        land_ids = land_ids[:land_count]
+
+        # each row's land pixels are contiguous in land_ids, so repeat the row weight per land pixel
+        land_weights = np.repeat(area_adjustments, land_per_row)
+
+        # histogram directly over the 24-bit colour space, one linear pass and no sort
+        pixel_counts = np.bincount(land_ids)
+        areas = np.bincount(land_ids, weights=land_weights)
+
+    unique_colors = np.flatnonzero(pixel_counts)
+    return unique_colors, pixel_counts[unique_colors], areas[unique_colors]
+
+def merge_similar_colors(unique_colors, pixel_counts, areas, quantize_bits):
+    """drop near-white colours as water, then merge colours sharing their top quantize_bits bits per channel under their most common exact colour; also returns the dropped pixel count"""
+    if not 1 <= quantize_bits <= 7:
+        raise ValueError(f"quantize_bits must be between 1 and 7, got {quantize_bits}")
+
+    r = (unique_colors >> 16) & 0xFF
+    g = (unique_colors >> 8) & 0xFF
+    b = unique_colors & 0xFF
+
+    # anti-aliased coastline fringe: every channel within a fixed distance of white, whatever quantize_bits is
+    near_white = np.minimum(np.minimum(r, g), b) >= 0xFF - NEAR_WHITE_TOLERANCE
+    water_pixels = int(np.sum(pixel_counts[near_white]))
+    land = ~near_white
+    unique_colors, pixel_counts, areas = unique_colors[land], pixel_counts[land], areas[land]
+    r, g, b = r[land], g[land], b[land]
+
+    shift = 8 - quantize_bits
+    bins = ((r >> shift) << (2 * quantize_bits)) | ((g >> shift) << quantize_bits) | (b >> shift)
+
+    group_bins, inverse = np.unique(bins, return_inverse=True)
+    merged_counts = np.zeros(len(group_bins), dtype=np.int64)
+    np.add.at(merged_counts, inverse, pixel_counts)
+    merged_areas = np.bincount(inverse, weights=areas, minlength=len(group_bins))
+
+    # sorted by bin then pixel count, the last colour of each bin is its dominant exact colour
+    order = np.lexsort((pixel_counts, bins))
+    sorted_bins = bins[order]
+    is_last = np.ones(len(sorted_bins), dtype=bool)
+    is_last[:-1] = sorted_bins[1:] != sorted_bins[:-1]
+    return unique_colors[order][is_last], merged_counts, merged_areas, water_pixels
+
+def load_rgb(image_path):
+    """load an image as an (H, W, 3) uint8 array without copying the decoded pixels again"""
+    if tifffile is not None and image_path.lower().endswith(('.tif', '.tiff')):
+        # check the layout from the header so other TIFFs are only decoded once, by Pillow
+        with tifffile.TiffFile(image_path) as tif:
+            series = tif.series[0]
+            if len(series.shape) == 3 and series.shape[2] == 3 and series.dtype == np.uint8:
+                return series.asarray()
+    with Image.open(image_path) as img:
+        return np.asarray(img.convert('RGB'))
+
+def calculate_map_sizes(image_path, equator_circumference, output_file='map_sizes.xlsx', quantize_bits=None):
     """calculate land sizes from equirectangular map and export to Excel"""
 
     print("\n" + "="*10)
@@ -17,14 +165,18 @@ def calculate_map_sizes(image_path, equator_circumference, output_file='map_size
         print(f"Ensure the file is either in the same folder as this script or is the complete path to the file.")
         return None
 
+    if quantize_bits is not None and not 1 <= quantize_bits <= 7:
+        print(f"Error: bits per channel must be between 1 and 7, got {quantize_bits}")
+        return None
+
     print(f"Loading: {image_path}")
     try:
-        img = Image.open(image_path).convert('RGB')
+        img_array = load_rgb(image_path)
     except Exception as e:
         print(f"Error loading image: {e}")
         return None
 
-    MAP_WIDTH, MAP_HEIGHT = img.size
+    MAP_HEIGHT, MAP_WIDTH = img_array.shape[:2]
     print(f"Dimensions: {MAP_WIDTH}x{MAP_HEIGHT} pixels")
 
     KM_PER_PIXEL = equator_circumference / MAP_WIDTH
@@ -34,55 +186,48 @@ def calculate_map_sizes(image_path, equator_circumference, output_file='map_size
     print(f"Km per pixel: {equator_circumference / MAP_WIDTH:.4f} km")
     print(f"Area per pixel (equator): {KM_PER_PIXEL:.4f} km²\n")
 
-    img_array = np.array(img)
-
     print("Adjusting for latitude...")
     y_coords = np.arange(MAP_HEIGHT)
 
     latitudes = 90 - (y_coords / MAP_HEIGHT) * 180
-    area_adjustments = AREA_PER_PIXEL * np.cos(np.radians(latitudes))
-    area_weights = np.repeat(area_adjustments[:, np.newaxis], MAP_WIDTH, axis=1)
+    # float32 halves the weight stream; per-colour sums are still accumulated in float64
+    area_adjustments = (AREA_PER_PIXEL * np.cos(np.radians(latitudes))).astype(np.float32)
 
     print("Processing pixels...")
-    color_ids = img_array[:, :, 0] * 65536 + img_array[:, :, 1] * 256 + img_array[:, :, 2]
-
-    land_mask = color_ids != 0xFFFFFF
-    unique_colors = np.unique(color_ids[land_mask])
+    unique_colors, pixel_counts, areas = aggregate_colors(img_array, area_adjustments)
 
     print(f"Found {len(unique_colors)} unique colors\n")
 
-    data = []
-    for i, color_id in enumerate(unique_colors):
-        mask = color_ids == color_id
-        pixels = int(np.sum(mask))
-        area = np.sum(area_weights[mask])
-
-        r = (color_id >> 16) & 0xFF
-        g = (color_id >> 8) & 0xFF
-        b = color_id & 0xFF
-        hex_color = f"#{r:02X}{g:02X}{b:02X}"
-
-        data.append({
-            'Hex Color': hex_color,
-            'Pixel Count': pixels,
-            'Area (km²)': area
-        })
-
-        if (i + 1) % 10 == 0 or (i + 1) == len(unique_colors):
-            print(f"Processed {i + 1}/{len(unique_colors)} colors")
-
-    df = pd.DataFrame(data)
-    df = df.sort_values(by='Area (km²)', ascending=False).reset_index(drop=True)
-    df.index += 1
-
-    total_pixels = np.sum(land_mask)
-    total_area = np.sum(area_weights[land_mask])
-
-    totals = pd.DataFrame([{
-        'Hex Color': 'TOTAL',
-        'Pixel Count': total_pixels,
-        'Area (km²)': total_area
-    }])
+    if quantize_bits is not None:
+        unique_colors, pixel_counts, areas, water_pixels = merge_similar_colors(unique_colors, pixel_counts, areas, quantize_bits)
+        print(f"Reclassified {water_pixels:,} near-white pixels as water")
+        print(f"Merged into {len(unique_colors)} colors at {quantize_bits} bits per channel\n")
+
+    # sort the column arrays largest area first, before any DataFrame exists
+    order = np.argsort(-areas, kind='stable')
+    unique_colors = unique_colors[order]
+    pixel_counts = pixel_counts[order]
+    areas = areas[order]
+
+    r = HEX_BYTES[(unique_colors >> 16) & 0xFF]
+    g = HEX_BYTES[(unique_colors >> 8) & 0xFF]
+    b = HEX_BYTES[unique_colors & 0xFF]
+    hex_colors = np.char.add(np.char.add(np.char.add('#', r), g), b)
+
+    df = pd.DataFrame({
+        'Hex Color': hex_colors,
+        'Pixel Count': pixel_counts,
+        'Area (km²)': areas
+    })
+
+    total_pixels = np.sum(pixel_counts)
+    total_area = np.sum(areas)
+
+    totals = pd.DataFrame({
+        'Hex Color': ['TOTAL'],
+        'Pixel Count': [total_pixels],
+        'Area (km²)': [total_area]
+    })
 
     df = pd.concat([df, totals], ignore_index=True)
 
@@ -90,7 +235,8 @@ def calculate_map_sizes(image_path, equator_circumference, output_file='map_size
 
     try:
         print(f"Exported results to '{output_file}'")
-        df.to_excel(output_file, index=False, sheet_name='Map Sizes', engine='openpyxl')
+        engine = 'xlsxwriter' if xlsxwriter is not None else 'openpyxl'
+        df.to_excel(output_file, index=False, sheet_name='Map Sizes', engine=engine)
     except Exception as e:
         print(f"Error exporting to Excel: {e}")
         return None
@@ -104,11 +250,12 @@ def calculate_map_sizes(image_path, equator_circumference, output_file='map_size
 
 def main():
 
-    try:
-        import openpyxl
-    except ImportError:
-        print("Warning: openpyxl not installed. Install with: pip install openpyxl")
-        sys.exit(1)
+    if xlsxwriter is None:
+        try:
+            import openpyxl
+        except ImportError:
+            print("Warning: openpyxl not installed. Install with: pip install openpyxl")
+            sys.exit(1)
 
     attempts = 0
 
@@ -152,9 +299,22 @@ def main():
             print("Invalid input for equator circumference. Using default value of 40075 km.")
             equator_circumference = 40075
 
+    quantize_bits = input("Enter bits per colour channel to merge near-identical colours, 1-7 (default: exact colours): ")
+
+    if quantize_bits.strip() == "":
+        quantize_bits = None
+    else:
+        try:
+            quantize_bits = int(quantize_bits)
+            if not 1 <= quantize_bits <= 7:
+                raise ValueError
+        except ValueError:
+            print("Invalid input for bits per channel. Using exact colours.")
+            quantize_bits = None
+
     output_filename = f"{os.path.splitext(map_filename)[0]}map_sizes.xlsx"
 
-    result = calculate_map_sizes(map_filename, equator_circumference, output_filename)
+    result = calculate_map_sizes(map_filename, equator_circumference, output_filename, quantize_bits)
 
     if result is not None:
         print("Script complete.")
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+
+import numpy as np
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import Calculate_Sizes
+
+EXAMPLE_MAP = os.path.join(os.path.dirname(__file__), '..', 'Equirectangular_Map_Example.png')
+
+# (hex colour, pixel count, area in km²) from the readme example
+EXPECTED = [
+    ('#000000', 40115, 69_893_123),
+    ('#761818', 21596, 33_930_371),
+    ('#B82424', 16300, 16_475_961),
+    ('#2F3EA9', 6011, 9_002_863),
+    ('#3F3F3F', 3376, 4_660_965),
+    ('TOTAL', 87398, 133_963_283),
+]
+
+
+def random_map(height, width, n_colors, seed=0):
+    """synthetic map of n_colors random countries on white water"""
+    rng = np.random.default_rng(seed)
+    palette = rng.integers(0, 255, (n_colors, 3), dtype=np.uint8)
+    labels = rng.integers(-1, n_colors, (height, width))
+    img_array = np.full((height, width, 3), 255, dtype=np.uint8)
+    img_array[labels >= 0] = palette[labels[labels >= 0]]
+    return img_array, rng.random(height).astype(np.float32)
+
+
+def test_numba_and_numpy_paths_agree(monkeypatch):
+    if Calculate_Sizes.njit is None:
+        pytest.skip("numba not installed")
+    img_array, area_adjustments = random_map(700, 300, 200)
+
+    colors, counts, areas = Calculate_Sizes.aggregate_colors(img_array, area_adjustments)
+    monkeypatch.setattr(Calculate_Sizes, 'njit', None)
+    fallback_colors, fallback_counts, fallback_areas = Calculate_Sizes.aggregate_colors(img_array, area_adjustments)
+
+    assert 0xFFFFFF not in colors
+    assert counts.sum() == np.count_nonzero((img_array != 255).any(axis=2))
+    np.testing.assert_array_equal(colors, fallback_colors)
+    np.testing.assert_array_equal(counts, fallback_counts)
+    np.testing.assert_allclose(areas, fallback_areas)
+
+
+def best_time(func, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_numba_path_is_faster_than_numpy_fallback(monkeypatch):
+    if Calculate_Sizes.njit is None:
+        pytest.skip("numba not installed")
+    img_array, area_adjustments = random_map(1024, 2048, 200)
+
+    # first call compiles (or loads the cached kernel)
+    Calculate_Sizes.aggregate_colors(img_array[:2], area_adjustments[:2])
+    numba_time = best_time(lambda: Calculate_Sizes.aggregate_colors(img_array, area_adjustments))
+    monkeypatch.setattr(Calculate_Sizes, 'njit', None)
+    numpy_time = best_time(lambda: Calculate_Sizes.aggregate_colors(img_array, area_adjustments))
+
+    assert numba_time < numpy_time
+
+
+def read_back(path):
+    sheet = openpyxl.load_workbook(path)['Map Sizes']
+    return [tuple(row) for row in sheet.iter_rows(values_only=True)]
+
+
+@pytest.mark.parametrize('use_xlsxwriter', [True, False])
+def test_example_map_written_to_excel(tmp_path, monkeypatch, use_xlsxwriter):
+    if use_xlsxwriter and Calculate_Sizes.xlsxwriter is None:
+        pytest.skip("xlsxwriter not installed")
+    if not use_xlsxwriter:
+        monkeypatch.setattr(Calculate_Sizes, 'xlsxwriter', None)
+
+    output_file = str(tmp_path / 'map_sizes.xlsx')
+    df = Calculate_Sizes.calculate_map_sizes(EXAMPLE_MAP, 40075, output_file)
+    assert df is not None
+
+    rows = read_back(output_file)
+    assert rows[0] == ('Hex Color', 'Pixel Count', 'Area (km²)')
+    assert len(rows) == len(EXPECTED) + 1
+    for (hex_color, pixels, area), expected in zip(rows[1:], EXPECTED):
+        assert (hex_color, pixels) == expected[:2]
+        assert area == pytest.approx(expected[2], abs=1)
+
+
+@pytest.mark.parametrize('quantize_bits', range(1, 8))
+def test_merge_keeps_light_countries_at_any_bit_depth(quantize_bits):
+    colors = np.array([0xFF8080, 0xC0C0C0, 0xFAFAFA, 0xF0F0F0, 0x000000])
+    counts = np.array([5, 7, 2, 3, 11])
+    areas = counts * 1.5
+
+    merged, merged_counts, merged_areas, water_pixels = Calculate_Sizes.merge_similar_colors(
+        colors, counts, areas, quantize_bits)
+
+    # only #FAFAFA is within the fixed near-white tolerance
+    assert water_pixels == 2
+    assert merged_counts.dtype == np.int64
+    assert merged_counts.sum() == 5 + 7 + 3 + 11
+    assert merged_areas.sum() == pytest.approx(1.5 * (5 + 7 + 3 + 11))
+    assert 0x000000 in merged
+
+
+def test_merge_labels_group_with_dominant_color():
+    colors = np.array([0x000000, 0x010203, 0x761818, 0x771919])
+    counts = np.array([10, 3, 5, 7])
+
+    merged, merged_counts, merged_areas, water_pixels = Calculate_Sizes.merge_similar_colors(
+        colors, counts, counts * 1.0, 5)
+
+    assert list(merged) == [0x000000, 0x771919]
+    assert list(merged_counts) == [13, 12]
+    assert water_pixels == 0
+
+
+@pytest.mark.parametrize('quantize_bits', [0, 8, 9])
+def test_quantize_bits_out_of_range_is_rejected(tmp_path, quantize_bits):
+    colors = np.array([0x000000, 0x761818])
+    counts = np.array([10, 5])
+    with pytest.raises(ValueError):
+        Calculate_Sizes.merge_similar_colors(colors, counts, counts * 1.0, quantize_bits)
+
+    output_file = tmp_path / 'map_sizes.xlsx'
+    assert Calculate_Sizes.calculate_map_sizes(EXAMPLE_MAP, 40075, str(output_file), quantize_bits) is None
+    assert not output_file.exists()
+
+
+@pytest.mark.parametrize('byteorder', ['little', 'big'])
+def test_pack_rgb_gives_rrggbb_ids(monkeypatch, byteorder):
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (7, 5, 3), dtype=np.uint8)
+    expected = (rgb[..., 0].astype(np.uint32) << 16) | (rgb[..., 1].astype(np.uint32) << 8) | rgb[..., 2]
+
+    monkeypatch.setattr(sys, 'byteorder', byteorder)
+    packed = Calculate_Sizes.pack_rgb(rgb)
+
+    # read the packed bytes back in the byte order pack_rgb was told the host uses
+    host_dtype = packed.dtype.newbyteorder('<' if byteorder == 'little' else '>')
+    np.testing.assert_array_equal(packed.view(host_dtype), expected)
+
+
+@pytest.mark.parametrize('layout', ['rgb', 'rgba', 'planar'])
+def test_load_rgb_reads_tiff(tmp_path, monkeypatch, layout):
+    tifffile = pytest.importorskip('tifffile')
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (6, 9, 3), dtype=np.uint8)
+    path = str(tmp_path / 'map.tiff')
+    if layout == 'rgb':
+        tifffile.imwrite(path, rgb, photometric='rgb')
+    elif layout == 'rgba':
+        rgba = np.concatenate([rgb, np.full((6, 9, 1), 255, dtype=np.uint8)], axis=2)
+        tifffile.imwrite(path, rgba, photometric='rgb', extrasamples=['unassalpha'])
+    else:
+        tifffile.imwrite(path, np.moveaxis(rgb, 2, 0), photometric='rgb', planarconfig='separate')
+
+    # only plain 8-bit RGB should be decoded by tifffile, everything else goes to Pillow
+    decoded_by_tifffile = []
+    asarray = tifffile.TiffPageSeries.asarray
+
+    def recording_asarray(self, *args, **kwargs):
+        decoded_by_tifffile.append(True)
+        return asarray(self, *args, **kwargs)
+
+    monkeypatch.setattr(tifffile.TiffPageSeries, 'asarray', recording_asarray)
+
+    np.testing.assert_array_equal(Calculate_Sizes.load_rgb(path), rgb)
+    assert decoded_by_tifffile == ([True] if layout == 'rgb' else [])